@@ -4,11 +4,20 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict
 import numpy as np
 import requests
 from PIL import Image
 import io
 import os
+import json
+import time
+import sys
+import hashlib
+import hmac
+import math
+import threading
 
 # =============================================
 # CONFIGURACIÓN STREAMLIT
@@ -20,8 +29,150 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Limpiar cache
-st.cache_data.clear()
+# =============================================
+# GESTOR DE CACHÉ
+# =============================================
+# Un solo gestor para datos cargados, datos derivados, figuras y exportaciones.
+# Las entradas derivadas se invalidan por versión de los datos, no con un borrado global.
+CACHES = ['datos', 'derivados', 'figuras', 'exportaciones']
+PRESUPUESTO_CACHE_MB_POR_DEFECTO = 512
+
+def leer_presupuesto_cache():
+    """Leer el presupuesto de caché (MB) desde ADIMATEC_CACHE_MB, o usar el valor por defecto"""
+    valor = os.environ.get("ADIMATEC_CACHE_MB")
+    if valor is None:
+        return PRESUPUESTO_CACHE_MB_POR_DEFECTO
+    try:
+        presupuesto = float(valor)
+        if math.isfinite(presupuesto) and presupuesto > 0:
+            return presupuesto
+    except ValueError:
+        pass
+    st.warning(f"ADIMATEC_CACHE_MB='{valor}' no es un número de MB válido; se usan {PRESUPUESTO_CACHE_MB_POR_DEFECTO} MB")
+    return PRESUPUESTO_CACHE_MB_POR_DEFECTO
+
+PRESUPUESTO_CACHE_MB = leer_presupuesto_cache()
+
+def estimar_bytes(valor):
+    """Estimar la memoria ocupada por un valor cacheado"""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if isinstance(valor, str):
+        return len(valor.encode('utf-8'))
+    if isinstance(valor, (list, tuple)):
+        return sum(estimar_bytes(v) for v in valor)
+    if isinstance(valor, dict):
+        return sum(estimar_bytes(v) for v in valor.values())
+    if isinstance(valor, go.Figure):
+        return len(valor.to_json())
+    return sys.getsizeof(valor)
+
+class GestorCache:
+    """Caché en memoria con presupuesto total de bytes, desalojo LRU por tamaño y contadores por caché"""
+    
+    def __init__(self, presupuesto_bytes, caches):
+        self.presupuesto_bytes = presupuesto_bytes
+        # (cache, clave) -> {'valor', 'bytes', 'dependencias', 'creado'}, de menos a más reciente
+        self.entradas = OrderedDict()
+        self.bytes_usados = 0
+        self.estadisticas = {cache: {'aciertos': 0, 'fallos': 0, 'desalojos': 0, 'invalidaciones': 0} for cache in caches}
+        self.lock = threading.RLock()
+    
+    def obtener(self, cache, clave, default=None, ttl=None):
+        """Devolver la entrada (marcándola como usada) o `default` si no existe o tiene más de `ttl` segundos"""
+        with self.lock:
+            entrada = self.entradas.get((cache, clave))
+            if entrada is None or (ttl is not None and time.time() - entrada['creado'] > ttl):
+                self.estadisticas[cache]['fallos'] += 1
+                return default
+            self.entradas.move_to_end((cache, clave))
+            self.estadisticas[cache]['aciertos'] += 1
+            return entrada['valor']
+    
+    def guardar(self, cache, clave, valor, dependencias=()):
+        """Guardar un valor y desalojar las entradas menos usadas hasta respetar el presupuesto"""
+        tamano = estimar_bytes(valor)
+        with self.lock:
+            self._quitar((cache, clave))
+            if tamano > self.presupuesto_bytes:
+                return valor
+            self.entradas[(cache, clave)] = {
+                'valor': valor,
+                'bytes': tamano,
+                'dependencias': frozenset(dependencias),
+                'creado': time.time(),
+            }
+            self.bytes_usados += tamano
+            while self.bytes_usados > self.presupuesto_bytes:
+                (cache_desalojado, _), entrada = self.entradas.popitem(last=False)
+                self.bytes_usados -= entrada['bytes']
+                self.estadisticas[cache_desalojado]['desalojos'] += 1
+        return valor
+    
+    def ver(self, cache, clave):
+        """Consultar una entrada sin tocar contadores, orden LRU ni vigencia"""
+        with self.lock:
+            entrada = self.entradas.get((cache, clave))
+            return None if entrada is None else entrada['valor']
+    
+    def obtener_o_calcular(self, cache, clave, dependencias, calcular):
+        ausente = object()
+        valor = self.obtener(cache, clave, ausente)
+        if valor is ausente:
+            valor = self.guardar(cache, clave, calcular(), dependencias)
+        return valor
+    
+    def eliminar(self, cache, clave):
+        with self.lock:
+            if self._quitar((cache, clave)):
+                self.estadisticas[cache]['invalidaciones'] += 1
+    
+    def invalidar(self, version):
+        """Eliminar todas las entradas que dependen de una versión de datos"""
+        with self.lock:
+            for cache, clave in [k for k, entrada in self.entradas.items() if version in entrada['dependencias']]:
+                self.eliminar(cache, clave)
+    
+    def vaciar(self):
+        with self.lock:
+            for cache, clave in list(self.entradas):
+                self.eliminar(cache, clave)
+    
+    def resumen(self):
+        """Contadores por caché para la vista de administración"""
+        with self.lock:
+            filas = []
+            for cache, stats in self.estadisticas.items():
+                entradas = [entrada for (c, _), entrada in self.entradas.items() if c == cache]
+                consultas = stats['aciertos'] + stats['fallos']
+                filas.append({
+                    'cache': cache,
+                    'entradas': len(entradas),
+                    'MB': sum(entrada['bytes'] for entrada in entradas) / 1024 ** 2,
+                    'aciertos': stats['aciertos'],
+                    'fallos': stats['fallos'],
+                    '% aciertos': (stats['aciertos'] / consultas * 100) if consultas > 0 else 0,
+                    'desalojos': stats['desalojos'],
+                    'invalidaciones': stats['invalidaciones'],
+                })
+            return pd.DataFrame(filas)
+    
+    def _quitar(self, llave):
+        entrada = self.entradas.pop(llave, None)
+        if entrada is not None:
+            self.bytes_usados -= entrada['bytes']
+        return entrada is not None
+
+@st.cache_resource
+def gestor_cache():
+    """Gestor de caché compartido entre sesiones"""
+    return GestorCache(int(PRESUPUESTO_CACHE_MB * 1024 ** 2), CACHES)
+
+gestor = gestor_cache()
 
 # Cargar logo
 @st.cache_data
@@ -54,52 +205,182 @@ with col_icon:
 
 st.markdown("---")
 
-@st.cache_data(ttl=300, show_spinner="Cargando datos desde Google Sheets...")
-def load_data():
-    """Cargar datos desde Google Sheets"""
+# =============================================
+# REGISTRO DE FUENTES DE DATOS (PLANTAS / AÑOS)
+# =============================================
+# Cada fuente es una partición (planta, año). "anio": None es la hoja vigente;
+# los años de historial archivados en hojas separadas se registran con su año.
+FUENTES_POR_DEFECTO = [
+    {
+        "planta": "Adimatec",
+        "anio": None,
+        "sheet_id": "17eEYewfzoBZXkFWBm5DOJp3IuvHg9WvN",
+        "gid_ot_master": "525532145",
+        "gid_procesos": "240160734",
+    },
+]
+
+CAMPOS_FUENTE = ["planta", "anio", "sheet_id", "gid_ot_master", "gid_procesos"]
+ANIO_VIGENTE = "Vigente"
+TTL_PARTICION = 300  # segundos
+MAX_DESCARGAS_PARALELAS = 8
+
+def cargar_registro_fuentes():
+    """Leer el registro de fuentes desde el JSON indicado en ADIMATEC_FUENTES, o usar el registro por defecto"""
+    ruta = os.environ.get("ADIMATEC_FUENTES")
+    if not ruta:
+        return FUENTES_POR_DEFECTO
     try:
-        # Sheet ID (la parte larga después de /d/)
-        sheet_id = "17eEYewfzoBZXkFWBm5DOJp3IuvHg9WvN"
-        
-        # URLs CORREGIDAS - formato de exportación directa
-        ot_master_csv = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid=525532145"
-        procesos_csv = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv&gid=240160734"
+        with open(ruta, encoding="utf-8") as f:
+            fuentes = json.load(f)
+        fuentes_validas = [fuente for fuente in fuentes if all(campo in fuente for campo in CAMPOS_FUENTE)]
+        if len(fuentes_validas) < len(fuentes):
+            st.warning(f"Se ignoraron {len(fuentes) - len(fuentes_validas)} fuentes sin los campos {', '.join(CAMPOS_FUENTE)}")
         
-        # Cargar datos
-        ot_master = pd.read_csv(ot_master_csv)
-        procesos = pd.read_csv(procesos_csv)
-        
-        return ot_master, procesos
+        # Cada (planta, año) es una partición: una fuente repetida pisaría a la anterior
+        fuentes_unicas = {}
+        for fuente in fuentes_validas:
+            fuente = dict(fuente, planta=str(fuente['planta']))
+            clave = clave_particion(fuente)
+            if clave in fuentes_unicas:
+                st.warning(f"Se ignoró una fuente repetida para {clave[0]} ({clave[1]})")
+                continue
+            fuentes_unicas[clave] = fuente
+        if fuentes_unicas:
+            return list(fuentes_unicas.values())
     except Exception as e:
-        st.error(f"Error al cargar los datos desde Google Sheets: {e}")
-        return None, None
+        st.warning(f"No se pudo leer el registro de fuentes '{ruta}': {e}")
+    return FUENTES_POR_DEFECTO
 
-# Cargar datos con spinner
-with st.spinner("Cargando datos desde Google Sheets..."):
-    ot_master, procesos = load_data()
+def etiqueta_anio(anio):
+    return ANIO_VIGENTE if anio is None else str(anio)
 
-if ot_master is None or procesos is None:
-    st.error("No se pudieron cargar los datos. Por favor, verifica la conexión e intenta nuevamente.")
-    st.stop()
+def clave_particion(fuente):
+    return (str(fuente['planta']), etiqueta_anio(fuente['anio']))
+
+def version_particion(ot_master, procesos):
+    """Huella del contenido de una partición; cambia solo si cambian sus datos"""
+    huella = hashlib.sha1()
+    for df in (ot_master, procesos):
+        huella.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return huella.hexdigest()[:12]
+
+def descargar_particion(fuente):
+    """Descargar OT Master y Procesos de una fuente y etiquetar cada fila con su origen"""
+    # URLs en formato de exportación directa
+    url_base = f"https://docs.google.com/spreadsheets/d/{fuente['sheet_id']}/export?format=csv&gid="
+    ot_master = pd.read_csv(url_base + str(fuente['gid_ot_master']))
+    procesos = pd.read_csv(url_base + str(fuente['gid_procesos']))
+    
+    planta, anio = clave_particion(fuente)
+    for df in (ot_master, procesos):
+        df['planta'] = planta
+        df['anio_fuente'] = anio
+    return ot_master, procesos
+
+def preparar_datos(particiones):
+    """Unir las particiones y normalizar tipos (OT como texto, columnas de fecha)"""
+    ot_master = pd.concat([particion['ot_master'] for particion in particiones], ignore_index=True)
+    procesos = pd.concat([particion['procesos'] for particion in particiones], ignore_index=True)
+    
+    # Asegurar que la columna 'ot' sea string en ambos dataframes
+    ot_master['ot'] = ot_master['ot'].astype(str)
+    procesos['ot'] = procesos['ot'].astype(str)
+    
+    # Un mismo número de OT puede repetirse entre plantas o años: las filas se enlazan por (planta, año, OT)
+    for df in (ot_master, procesos):
+        df['ot_clave'] = df['planta'] + '/' + df['anio_fuente'] + '/' + df['ot']
+    
+    # Convertir fechas en ot_master
+    date_columns = ['fecha_entrega', 'fecha_impresion', 'fecha_terminado', 'fecha_entregada']
+    for col in date_columns:
+        if col in ot_master.columns:
+            ot_master[col] = pd.to_datetime(ot_master[col], errors='coerce')
+    
+    # Convertir fechas en procesos
+    date_columns_procesos = ['fecha_inicio_1', 'fecha_inicio_2']
+    for col in date_columns_procesos:
+        if col in procesos.columns:
+            procesos[col] = pd.to_datetime(procesos[col], errors='coerce')
+    
+    return ot_master, procesos
 
-# Asegurar que la columna 'ot' sea string en ambos dataframes
-ot_master['ot'] = ot_master['ot'].astype(str)
-procesos['ot'] = procesos['ot'].astype(str)
+def load_data(fuentes):
+    """Cargar desde Google Sheets solo las particiones seleccionadas, descargando en paralelo las que falten o hayan expirado.
+    
+    Devuelve ot_master, procesos y las versiones de las particiones usadas.
+    """
+    # La vista se arma con estas particiones; la caché solo las guarda para las siguientes ejecuciones
+    particiones = {}
+    pendientes = []
+    for fuente in fuentes:
+        particion = gestor.obtener('datos', clave_particion(fuente), ttl=TTL_PARTICION)
+        if particion is None:
+            pendientes.append(fuente)
+        else:
+            particiones[clave_particion(fuente)] = particion
+    
+    if pendientes:
+        with ThreadPoolExecutor(max_workers=min(MAX_DESCARGAS_PARALELAS, len(pendientes))) as executor:
+            futuros = {executor.submit(descargar_particion, fuente): fuente for fuente in pendientes}
+            for futuro in as_completed(futuros):
+                clave = clave_particion(futuros[futuro])
+                anterior = gestor.ver('datos', clave)
+                try:
+                    ot_master, procesos = futuro.result()
+                except Exception as e:
+                    st.error(f"Error al cargar los datos de {clave[0]} ({clave[1]}) desde Google Sheets: {e}")
+                    # Si existe una copia anterior de la partición se sigue usando
+                    if anterior is not None:
+                        particiones[clave] = anterior
+                    continue
+                version = version_particion(ot_master, procesos)
+                if anterior is not None and anterior['version'] != version:
+                    gestor.invalidar(anterior['version'])
+                particiones[clave] = gestor.guardar('datos', clave, {'version': version, 'ot_master': ot_master, 'procesos': procesos})
+                if gestor.ver('datos', clave) is None:
+                    st.warning(f"Los datos de {clave[0]} ({clave[1]}) superan el presupuesto de caché; se volverán a descargar en la próxima ejecución")
+    
+    particiones = [particiones[clave_particion(fuente)] for fuente in fuentes if clave_particion(fuente) in particiones]
+    if not particiones:
+        return None, None, None
+    
+    versiones = tuple(particion['version'] for particion in particiones)
+    ot_master, procesos = gestor.obtener_o_calcular(
+        'derivados', ('datos', versiones), versiones, lambda: preparar_datos(particiones)
+    )
+    return ot_master, procesos, versiones
 
 # Sidebar con filtros
 st.sidebar.header("🔍 Filtros")
 
-# Convertir fechas en ot_master
-date_columns = ['fecha_entrega', 'fecha_impresion', 'fecha_terminado', 'fecha_entregada']
-for col in date_columns:
-    if col in ot_master.columns:
-        ot_master[col] = pd.to_datetime(ot_master[col], errors='coerce')
+# Selección de particiones: solo se cargan las plantas y años elegidos
+st.sidebar.subheader("🏭 Fuentes de Datos")
+registro_fuentes = cargar_registro_fuentes()
+
+plantas = list(dict.fromkeys(fuente['planta'] for fuente in registro_fuentes))
+plantas_seleccionadas = st.sidebar.multiselect("Planta", plantas, default=plantas[:1])
+
+fuentes_plantas = [fuente for fuente in registro_fuentes if fuente['planta'] in plantas_seleccionadas]
+anios_archivo = sorted({etiqueta_anio(fuente['anio']) for fuente in fuentes_plantas if fuente['anio'] is not None}, reverse=True)
+anios = ([ANIO_VIGENTE] if any(fuente['anio'] is None for fuente in fuentes_plantas) else []) + anios_archivo
+anios_seleccionados = st.sidebar.multiselect("Año", anios, default=anios[:1])
 
-# Convertir fechas en procesos
-date_columns_procesos = ['fecha_inicio_1', 'fecha_inicio_2']
-for col in date_columns_procesos:
-    if col in procesos.columns:
-        procesos[col] = pd.to_datetime(procesos[col], errors='coerce')
+fuentes_seleccionadas = [fuente for fuente in fuentes_plantas if etiqueta_anio(fuente['anio']) in anios_seleccionados]
+if not fuentes_seleccionadas:
+    st.warning("Selecciona al menos una planta y un año para cargar datos.")
+    st.stop()
+
+# Cargar datos con spinner
+with st.spinner("Cargando datos desde Google Sheets..."):
+    ot_master, procesos, versiones_datos = load_data(fuentes_seleccionadas)
+
+if ot_master is None or procesos is None:
+    st.error("No se pudieron cargar los datos. Por favor, verifica la conexión e intenta nuevamente.")
+    st.stop()
+
+# Versión del conjunto de datos de la vista: clave de todo lo derivado de él
+version_datos = hashlib.sha1("|".join(versiones_datos).encode()).hexdigest()[:12]
 
 # Filtros principales
 clientes = ['Todos'] + sorted(ot_master['cliente'].dropna().unique().tolist())
@@ -109,8 +390,13 @@ estatus_options = ['Todos'] + sorted(ot_master['estatus'].dropna().unique().toli
 estatus_seleccionado = st.sidebar.selectbox("Estatus", estatus_options)
 
 # Filtro de OT
-ots = ["Todas"] + sorted(ot_master['ot'].astype(str).unique().tolist())
-ot_seleccionada = st.sidebar.selectbox("OT", ots)
+# Con una sola partición la OT se muestra tal cual; con varias se indica su planta y año
+if len(versiones_datos) > 1:
+    etiquetas_ot = dict(zip(ot_master['ot_clave'], ot_master['ot'] + ' (' + ot_master['planta'] + ' ' + ot_master['anio_fuente'] + ')'))
+else:
+    etiquetas_ot = dict(zip(ot_master['ot_clave'], ot_master['ot']))
+ots = ["Todas"] + sorted(etiquetas_ot, key=lambda clave: etiquetas_ot[clave])
+ot_seleccionada = st.sidebar.selectbox("OT", ots, format_func=lambda clave: etiquetas_ot.get(clave, clave))
 
 # Filtros de empleados SIN REPETIDOS
 st.sidebar.subheader("👥 Filtros por Empleados")
@@ -129,10 +415,13 @@ def limpiar_nombre(nombre):
     return nombre_limpio if nombre_limpio != '' else None
 
 # Obtener lista única de empleados
-empleados_1 = [limpiar_nombre(x) for x in procesos['empleado_1'].dropna().unique()]
-empleados_2 = [limpiar_nombre(x) for x in procesos['empleado_2'].dropna().unique()]
-todos_empleados = list(set([emp for emp in empleados_1 + empleados_2 if emp is not None]))
-todos_empleados = ['Todos'] + sorted(todos_empleados)
+def listar_empleados():
+    empleados_1 = [limpiar_nombre(x) for x in procesos['empleado_1'].dropna().unique()]
+    empleados_2 = [limpiar_nombre(x) for x in procesos['empleado_2'].dropna().unique()]
+    todos_empleados = list(set([emp for emp in empleados_1 + empleados_2 if emp is not None]))
+    return ['Todos'] + sorted(todos_empleados)
+
+todos_empleados = gestor.obtener_o_calcular('derivados', ('empleados', version_datos), versiones_datos, listar_empleados)
 
 empleado_seleccionado = st.sidebar.selectbox("Empleado", todos_empleados)
 
@@ -149,38 +438,48 @@ else:
     fecha_fin = None
 
 # Aplicar filtros
-ot_master_filtrado = ot_master.copy()
-procesos_filtrados = procesos.copy()
-
-if cliente_seleccionado != 'Todos':
-    ot_master_filtrado = ot_master_filtrado[ot_master_filtrado['cliente'] == cliente_seleccionado]
-    procesos_filtrados = procesos_filtrados[procesos_filtrados['ot'].isin(ot_master_filtrado['ot'])]
-
-if estatus_seleccionado != 'Todos':
-    ot_master_filtrado = ot_master_filtrado[ot_master_filtrado['estatus'] == estatus_seleccionado]
-    procesos_filtrados = procesos_filtrados[procesos_filtrados['ot'].isin(ot_master_filtrado['ot'])]
-
-if ot_seleccionada != 'Todas':
-    ot_master_filtrado = ot_master_filtrado[ot_master_filtrado['ot'] == ot_seleccionada]
-    procesos_filtrados = procesos_filtrados[procesos_filtrados['ot'] == ot_seleccionada]
-
-if empleado_seleccionado != 'Todos':
-    procesos_temp = procesos_filtrados.copy()
-    procesos_temp['empleado_1_clean'] = procesos_temp['empleado_1'].apply(limpiar_nombre)
-    procesos_temp['empleado_2_clean'] = procesos_temp['empleado_2'].apply(limpiar_nombre)
-    procesos_filtrados = procesos_temp[
-        (procesos_temp['empleado_1_clean'] == empleado_seleccionado) | 
-        (procesos_temp['empleado_2_clean'] == empleado_seleccionado)
-    ]
-    procesos_filtrados = procesos_filtrados.drop(['empleado_1_clean', 'empleado_2_clean'], axis=1)
-    ot_master_filtrado = ot_master_filtrado[ot_master_filtrado['ot'].isin(procesos_filtrados['ot'])]
-
-if fecha_inicio and fecha_fin:
-    ot_master_filtrado = ot_master_filtrado[
-        (ot_master_filtrado['fecha_entrega'] >= pd.Timestamp(fecha_inicio)) &
-        (ot_master_filtrado['fecha_entrega'] <= pd.Timestamp(fecha_fin))
-    ]
-    procesos_filtrados = procesos_filtrados[procesos_filtrados['ot'].isin(ot_master_filtrado['ot'])]
+def aplicar_filtros():
+    ot_master_filtrado = ot_master.copy()
+    procesos_filtrados = procesos.copy()
+
+    if cliente_seleccionado != 'Todos':
+        ot_master_filtrado = ot_master_filtrado[ot_master_filtrado['cliente'] == cliente_seleccionado]
+        procesos_filtrados = procesos_filtrados[procesos_filtrados['ot_clave'].isin(ot_master_filtrado['ot_clave'])]
+
+    if estatus_seleccionado != 'Todos':
+        ot_master_filtrado = ot_master_filtrado[ot_master_filtrado['estatus'] == estatus_seleccionado]
+        procesos_filtrados = procesos_filtrados[procesos_filtrados['ot_clave'].isin(ot_master_filtrado['ot_clave'])]
+
+    if ot_seleccionada != 'Todas':
+        ot_master_filtrado = ot_master_filtrado[ot_master_filtrado['ot_clave'] == ot_seleccionada]
+        procesos_filtrados = procesos_filtrados[procesos_filtrados['ot_clave'] == ot_seleccionada]
+
+    if empleado_seleccionado != 'Todos':
+        procesos_temp = procesos_filtrados.copy()
+        procesos_temp['empleado_1_clean'] = procesos_temp['empleado_1'].apply(limpiar_nombre)
+        procesos_temp['empleado_2_clean'] = procesos_temp['empleado_2'].apply(limpiar_nombre)
+        procesos_filtrados = procesos_temp[
+            (procesos_temp['empleado_1_clean'] == empleado_seleccionado) | 
+            (procesos_temp['empleado_2_clean'] == empleado_seleccionado)
+        ]
+        procesos_filtrados = procesos_filtrados.drop(['empleado_1_clean', 'empleado_2_clean'], axis=1)
+        ot_master_filtrado = ot_master_filtrado[ot_master_filtrado['ot_clave'].isin(procesos_filtrados['ot_clave'])]
+
+    if fecha_inicio and fecha_fin:
+        ot_master_filtrado = ot_master_filtrado[
+            (ot_master_filtrado['fecha_entrega'] >= pd.Timestamp(fecha_inicio)) &
+            (ot_master_filtrado['fecha_entrega'] <= pd.Timestamp(fecha_fin))
+        ]
+        procesos_filtrados = procesos_filtrados[procesos_filtrados['ot_clave'].isin(ot_master_filtrado['ot_clave'])]
+    
+    return ot_master_filtrado, procesos_filtrados
+
+filtros = (cliente_seleccionado, estatus_seleccionado, ot_seleccionada, empleado_seleccionado, fecha_inicio, fecha_fin)
+ot_master_filtrado, procesos_filtrados = gestor.obtener_o_calcular(
+    'derivados', ('filtros', version_datos) + filtros, versiones_datos, aplicar_filtros
+)
+# Copia propia: la vista agrega columnas sobre el frame filtrado
+ot_master_filtrado = ot_master_filtrado.copy()
 
 # Definir estados que NO se consideran vencidos
 estados_no_vencidos = ['FACTURADO', 'OK', 'OK NO ENTREGADO']
@@ -196,6 +495,17 @@ ot_master_filtrado['estado_entrega'] = ot_master_filtrado.apply(
     axis=1
 )
 
+# Clave de la vista actual para figuras y exportaciones: datos, filtros y estado de entrega calculado
+# (el estado depende de la hora actual, así que se incluye su huella y no solo la fecha)
+huella_estados = hashlib.sha1(
+    pd.util.hash_pandas_object(ot_master_filtrado['estado_entrega'], index=False).values.tobytes()
+).hexdigest()[:12]
+clave_vista = (version_datos,) + filtros + (huella_estados,)
+
+def figura(nombre, construir):
+    """Figura de la vista actual, reutilizada mientras no cambien los datos ni los filtros"""
+    return gestor.obtener_o_calcular('figuras', (nombre,) + clave_vista, versiones_datos, construir)
+
 # Calcular porcentaje de facturación
 total_ots = len(ot_master_filtrado)
 ots_facturadas = len(ot_master_filtrado[ot_master_filtrado['estatus'] == 'FACTURADO'])
@@ -274,17 +584,20 @@ estados_interes = ['Vencida', 'Por vencer']
 estado_entrega_counts_filtrado = estado_entrega_counts[estado_entrega_counts.index.isin(estados_interes)]
 
 if not estado_entrega_counts_filtrado.empty:
-    fig_ots_vencidas = px.bar(
-        x=estado_entrega_counts_filtrado.index,
-        y=estado_entrega_counts_filtrado.values,
-        title="OTs Vencidas y Por Vencer (Solo OTs Activas)",
-        labels={'x': 'Estado de Entrega', 'y': 'Cantidad de OTs'},
-        color=estado_entrega_counts_filtrado.index,
-        color_discrete_map={'Vencida': '#FF4B4B', 'Por vencer': '#FFA500'},
-        text=estado_entrega_counts_filtrado.values
-    )
-    fig_ots_vencidas.update_traces(texttemplate='%{text}', textposition='outside')
-    fig_ots_vencidas.update_layout(showlegend=False, yaxis_title="Cantidad de OTs", xaxis_title="", height=400)
+    def construir_fig_ots_vencidas():
+        fig_ots_vencidas = px.bar(
+            x=estado_entrega_counts_filtrado.index,
+            y=estado_entrega_counts_filtrado.values,
+            title="OTs Vencidas y Por Vencer (Solo OTs Activas)",
+            labels={'x': 'Estado de Entrega', 'y': 'Cantidad de OTs'},
+            color=estado_entrega_counts_filtrado.index,
+            color_discrete_map={'Vencida': '#FF4B4B', 'Por vencer': '#FFA500'},
+            text=estado_entrega_counts_filtrado.values
+        )
+        fig_ots_vencidas.update_traces(texttemplate='%{text}', textposition='outside')
+        fig_ots_vencidas.update_layout(showlegend=False, yaxis_title="Cantidad de OTs", xaxis_title="", height=400)
+        return fig_ots_vencidas
+    fig_ots_vencidas = figura('ots_vencidas', construir_fig_ots_vencidas)
     st.plotly_chart(fig_ots_vencidas, use_container_width=True)
 else:
     st.info("No hay OTs vencidas o por vencer con los filtros actuales.")
@@ -293,14 +606,14 @@ else:
 col1, col2 = st.columns(2)
 with col1:
     st.subheader("📋 OTs Vencidas (Solo Activas)")
-    ots_vencidas_df = ot_master_filtrado[(ot_master_filtrado['estado_entrega'] == 'Vencida') & (~ot_master_filtrado['estatus'].isin(estados_no_vencidos))][['ot', 'cliente', 'fecha_entrega', 'estatus']]
+    ots_vencidas_df = ot_master_filtrado[(ot_master_filtrado['estado_entrega'] == 'Vencida') & (~ot_master_filtrado['estatus'].isin(estados_no_vencidos))][['ot', 'planta', 'anio_fuente', 'cliente', 'fecha_entrega', 'estatus']]
     if not ots_vencidas_df.empty: 
         st.dataframe(ots_vencidas_df, use_container_width=True, height=200)
     else: 
         st.info("No hay OTs vencidas activas")
 with col2:
     st.subheader("📋 OTs por Vencer (Próximos 7 días, Solo Activas)")
-    ots_por_vencer_df = ot_master_filtrado[(ot_master_filtrado['estado_entrega'] == 'Por vencer') & (~ot_master_filtrado['estatus'].isin(estados_no_vencidos))][['ot', 'cliente', 'fecha_entrega', 'estatus']]
+    ots_por_vencer_df = ot_master_filtrado[(ot_master_filtrado['estado_entrega'] == 'Por vencer') & (~ot_master_filtrado['estatus'].isin(estados_no_vencidos))][['ot', 'planta', 'anio_fuente', 'cliente', 'fecha_entrega', 'estatus']]
     if not ots_por_vencer_df.empty: 
         st.dataframe(ots_por_vencer_df, use_container_width=True, height=200)
     else: 
@@ -309,7 +622,7 @@ with col2:
 # OTs Completadas
 st.markdown("---")
 st.header("✅ OTs Completadas")
-ots_completadas_df = ot_master_filtrado[ot_master_filtrado['estatus'].isin(estados_no_vencidos)][['ot', 'cliente', 'fecha_entrega', 'estatus', 'fecha_terminado']]
+ots_completadas_df = ot_master_filtrado[ot_master_filtrado['estatus'].isin(estados_no_vencidos)][['ot', 'planta', 'anio_fuente', 'cliente', 'fecha_entrega', 'estatus', 'fecha_terminado']]
 if not ots_completadas_df.empty: 
     st.dataframe(ots_completadas_df, use_container_width=True, height=200)
 else: 
@@ -322,15 +635,18 @@ col1, col2 = st.columns(2)
 
 with col1:
     if total_ots > 0 and total_reprocesos > 0:
-        fig_reprocesos = px.pie(
-            values=[total_reprocesos, total_ots - total_reprocesos],
-            names=['Reprocesos', 'OTs Normales'],
-            title="Distribución: OTs Normales vs Reprocesos",
-            hole=0.4,
-            color=['Reprocesos', 'OTs Normales'],
-            color_discrete_map={'Reprocesos': '#FFA15A', 'OTs Normales': '#636EFA'}
-        )
-        fig_reprocesos.update_traces(textinfo='percent+label')
+        def construir_fig_reprocesos():
+            fig_reprocesos = px.pie(
+                values=[total_reprocesos, total_ots - total_reprocesos],
+                names=['Reprocesos', 'OTs Normales'],
+                title="Distribución: OTs Normales vs Reprocesos",
+                hole=0.4,
+                color=['Reprocesos', 'OTs Normales'],
+                color_discrete_map={'Reprocesos': '#FFA15A', 'OTs Normales': '#636EFA'}
+            )
+            fig_reprocesos.update_traces(textinfo='percent+label')
+            return fig_reprocesos
+        fig_reprocesos = figura('reprocesos', construir_fig_reprocesos)
         st.plotly_chart(fig_reprocesos, use_container_width=True)
     else: 
         st.info("No hay reprocesos para mostrar")
@@ -351,7 +667,10 @@ with col1:
     if not ot_master_filtrado.empty and 'cliente' in ot_master_filtrado.columns:
         ots_por_cliente = ot_master_filtrado['cliente'].value_counts()
         if not ots_por_cliente.empty:
-            fig_clientes = px.pie(values=ots_por_cliente.values, names=ots_por_cliente.index, title="Distribución de OTs por Cliente")
+            def construir_fig_clientes():
+                fig_clientes = px.pie(values=ots_por_cliente.values, names=ots_por_cliente.index, title="Distribución de OTs por Cliente")
+                return fig_clientes
+            fig_clientes = figura('clientes', construir_fig_clientes)
             st.plotly_chart(fig_clientes, use_container_width=True)
         else: 
             st.info("No hay datos de clientes para mostrar")
@@ -362,7 +681,10 @@ with col2:
     if not ot_master_filtrado.empty and 'estatus' in ot_master_filtrado.columns:
         ots_por_estatus = ot_master_filtrado['estatus'].value_counts()
         if not ots_por_estatus.empty:
-            fig_estatus = px.bar(x=ots_por_estatus.index, y=ots_por_estatus.values, title="OTs por Estado", labels={'x': 'Estatus', 'y': 'Cantidad'}, color=ots_por_estatus.index)
+            def construir_fig_estatus():
+                fig_estatus = px.bar(x=ots_por_estatus.index, y=ots_por_estatus.values, title="OTs por Estado", labels={'x': 'Estatus', 'y': 'Cantidad'}, color=ots_por_estatus.index)
+                return fig_estatus
+            fig_estatus = figura('estatus', construir_fig_estatus)
             st.plotly_chart(fig_estatus, use_container_width=True)
         else: 
             st.info("No hay datos de estatus para mostrar")
@@ -378,9 +700,12 @@ if total_horas_programadas > 0:
     valores = [total_horas_programadas, horas_desviacion_positiva, horas_desviacion_negativa]
     colores = ['#1f77b4', '#2ca02c', '#d62728']
     
-    fig_desviaciones = go.Figure()
-    fig_desviaciones.add_trace(go.Bar(x=categorias, y=valores, marker_color=colores, text=[f'{val:.1f}h' for val in valores], textposition='outside'))
-    fig_desviaciones.update_layout(title="Comparación de Horas Programadas vs Desviaciones", yaxis_title="Horas", xaxis_title="", showlegend=False, height=500)
+    def construir_fig_desviaciones():
+        fig_desviaciones = go.Figure()
+        fig_desviaciones.add_trace(go.Bar(x=categorias, y=valores, marker_color=colores, text=[f'{val:.1f}h' for val in valores], textposition='outside'))
+        fig_desviaciones.update_layout(title="Comparación de Horas Programadas vs Desviaciones", yaxis_title="Horas", xaxis_title="", showlegend=False, height=500)
+        return fig_desviaciones
+    fig_desviaciones = figura('desviaciones', construir_fig_desviaciones)
     st.plotly_chart(fig_desviaciones, use_container_width=True)
     
     col1, col2, col3 = st.columns(3)
@@ -404,7 +729,7 @@ if not ots_desviacion_positiva.empty or not ots_desviacion_negativa.empty:
         st.subheader("✅ OTs con Desviaciones Positivas")
         st.info("OTs que cumplieron o mejoraron el tiempo estimado")
         if not ots_desviacion_positiva.empty:
-            columnas_positivas = ['ot', 'cliente', 'horas_estimadas_ot', 'horas_reales_ot', 'diferencia_horas']
+            columnas_positivas = ['ot', 'planta', 'anio_fuente', 'cliente', 'horas_estimadas_ot', 'horas_reales_ot', 'diferencia_horas']
             columnas_disponibles = [col for col in columnas_positivas if col in ots_desviacion_positiva.columns]
             
             df_positivas_display = ots_desviacion_positiva[columnas_disponibles].copy()
@@ -422,7 +747,7 @@ if not ots_desviacion_positiva.empty or not ots_desviacion_negativa.empty:
         st.subheader("⚠️ OTs con Desviaciones Negativas")
         st.warning("OTs que excedieron el tiempo estimado")
         if not ots_desviacion_negativa.empty:
-            columnas_negativas = ['ot', 'cliente', 'horas_estimadas_ot', 'horas_reales_ot', 'diferencia_horas']
+            columnas_negativas = ['ot', 'planta', 'anio_fuente', 'cliente', 'horas_estimadas_ot', 'horas_reales_ot', 'diferencia_horas']
             columnas_disponibles = [col for col in columnas_negativas if col in ots_desviacion_negativa.columns]
             
             st.dataframe(ots_desviacion_negativa[columnas_disponibles].sort_values('diferencia_horas', ascending=False), 
@@ -439,49 +764,53 @@ st.header("📈 Análisis de Pareto - Desviaciones Negativas")
 
 if not ots_desviacion_negativa.empty:
     # Preparar datos para Pareto
-    pareto_data = ots_desviacion_negativa[['ot', 'diferencia_horas']].copy()
+    pareto_data = ots_desviacion_negativa[['ot_clave', 'diferencia_horas']].copy()
     pareto_data = pareto_data.sort_values('diferencia_horas', ascending=False)
+    pareto_data['ot'] = pareto_data['ot_clave'].map(etiquetas_ot)
     
     # Calcular porcentaje acumulado
     pareto_data['porcentaje_acumulado'] = (pareto_data['diferencia_horas'].cumsum() / pareto_data['diferencia_horas'].sum()) * 100
     
     # Crear gráfico de Pareto
-    fig_pareto = go.Figure()
-    
-    # Barras de desviaciones
-    fig_pareto.add_trace(go.Bar(
-        x=pareto_data['ot'],
-        y=pareto_data['diferencia_horas'],
-        name='Horas de Desviación',
-        marker_color='#FF6B6B',
-        text=pareto_data['diferencia_horas'].round(1),
-        textposition='outside'
-    ))
-    
-    # Línea de porcentaje acumulado
-    fig_pareto.add_trace(go.Scatter(
-        x=pareto_data['ot'],
-        y=pareto_data['porcentaje_acumulado'],
-        name='Porcentaje Acumulado',
-        line=dict(color='#4ECDC4', width=3),
-        yaxis='y2',
-        mode='lines+markers'
-    ))
-    
-    fig_pareto.update_layout(
-        title="Principio de Pareto - Desviaciones Negativas por OT",
-        xaxis_title="OT",
-        yaxis_title="Horas de Desviación Negativa",
-        yaxis2=dict(
-            title="Porcentaje Acumulado (%)",
-            overlaying='y',
-            side='right',
-            range=[0, 100]
-        ),
-        showlegend=True,
-        height=500,
-        xaxis=dict(tickangle=45)
-    )
+    def construir_fig_pareto():
+        fig_pareto = go.Figure()
+        
+        # Barras de desviaciones
+        fig_pareto.add_trace(go.Bar(
+            x=pareto_data['ot'],
+            y=pareto_data['diferencia_horas'],
+            name='Horas de Desviación',
+            marker_color='#FF6B6B',
+            text=pareto_data['diferencia_horas'].round(1),
+            textposition='outside'
+        ))
+        
+        # Línea de porcentaje acumulado
+        fig_pareto.add_trace(go.Scatter(
+            x=pareto_data['ot'],
+            y=pareto_data['porcentaje_acumulado'],
+            name='Porcentaje Acumulado',
+            line=dict(color='#4ECDC4', width=3),
+            yaxis='y2',
+            mode='lines+markers'
+        ))
+        
+        fig_pareto.update_layout(
+            title="Principio de Pareto - Desviaciones Negativas por OT",
+            xaxis_title="OT",
+            yaxis_title="Horas de Desviación Negativa",
+            yaxis2=dict(
+                title="Porcentaje Acumulado (%)",
+                overlaying='y',
+                side='right',
+                range=[0, 100]
+            ),
+            showlegend=True,
+            height=500,
+            xaxis=dict(tickangle=45)
+        )
+        return fig_pareto
+    fig_pareto = figura('pareto', construir_fig_pareto)
     
     st.plotly_chart(fig_pareto, use_container_width=True)
     
@@ -505,10 +834,10 @@ if not ots_desviacion_negativa.empty:
     # Tabla de OTs críticas
     st.subheader("🎯 OTs Críticas (Principio 80/20)")
     
-    ots_criticas_ids = ots_80_percent['ot'].tolist()
-    ots_criticas = ots_desviacion_negativa[ots_desviacion_negativa['ot'].isin(ots_criticas_ids)].copy()
+    ots_criticas_ids = ots_80_percent['ot_clave'].tolist()
+    ots_criticas = ots_desviacion_negativa[ots_desviacion_negativa['ot_clave'].isin(ots_criticas_ids)].copy()
     
-    columnas_posibles = ['ot', 'cliente', 'descripcion', 'horas_estimadas_ot', 'horas_reales_ot', 'diferencia_horas', 'estatus']
+    columnas_posibles = ['ot', 'planta', 'anio_fuente', 'cliente', 'descripcion', 'horas_estimadas_ot', 'horas_reales_ot', 'diferencia_horas', 'estatus']
     columnas_disponibles = [col for col in columnas_posibles if col in ots_criticas.columns]
     
     if len(columnas_disponibles) > 0:
@@ -537,15 +866,18 @@ col1, col2 = st.columns(2)
 
 with col1:
     if total_ots > 0:
-        fig_facturacion = px.pie(
-            values=[ots_facturadas, total_ots - ots_facturadas],
-            names=['Facturado', 'No Facturado'],
-            title="Total de OTs vs Facturado",
-            hole=0.4,
-            color=['Facturado', 'No Facturado'],
-            color_discrete_map={'Facturado': '#00CC96', 'No Facturado': '#EF553B'}
-        )
-        fig_facturacion.update_traces(textinfo='percent+label')
+        def construir_fig_facturacion():
+            fig_facturacion = px.pie(
+                values=[ots_facturadas, total_ots - ots_facturadas],
+                names=['Facturado', 'No Facturado'],
+                title="Total de OTs vs Facturado",
+                hole=0.4,
+                color=['Facturado', 'No Facturado'],
+                color_discrete_map={'Facturado': '#00CC96', 'No Facturado': '#EF553B'}
+            )
+            fig_facturacion.update_traces(textinfo='percent+label')
+            return fig_facturacion
+        fig_facturacion = figura('facturacion', construir_fig_facturacion)
         st.plotly_chart(fig_facturacion, use_container_width=True)
     else: 
         st.info("No hay OTs para mostrar el gráfico de facturación")
@@ -565,69 +897,69 @@ with col2:
 st.markdown("---")
 st.header("📊 Generar Reportes")
 
+def generar_excel():
+    """Construir el archivo Excel completo en memoria"""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        # Hoja 1: OT Master
+        ot_master_filtrado.drop(columns='ot_clave').to_excel(writer, sheet_name='OT_Master', index=False)
+        
+        # Hoja 2: Procesos
+        if not procesos_filtrados.empty:
+            procesos_filtrados.drop(columns='ot_clave').to_excel(writer, sheet_name='Procesos', index=False)
+        
+        # Hoja 3: Resumen Ejecutivo
+        resumen_data = {
+            'Métrica': [
+                'Total OTs', 
+                'OTs Facturadas', 
+                'OTs en Proceso', 
+                'OTs Vencidas', 
+                'OTs por Vencer',
+                '% Facturación',
+                '% Reprocesos',
+                'Horas Programadas Totales',
+                'Desviaciones Positivas',
+                'Desviaciones Negativas'
+            ],
+            'Valor': [
+                total_ots,
+                ots_facturadas,
+                ots_en_proceso,
+                ots_vencidas,
+                ots_por_vencer,
+                f"{porcentaje_facturado:.1f}%",
+                f"{porcentaje_reprocesos:.1f}%",
+                f"{total_horas_programadas:.1f}h",
+                f"{horas_desviacion_positiva:.1f}h",
+                f"{horas_desviacion_negativa:.1f}h"
+            ]
+        }
+        pd.DataFrame(resumen_data).to_excel(writer, sheet_name='Resumen', index=False)
+        
+        # Hoja 4: OTs Críticas
+        if not ots_desviacion_negativa.empty:
+            columnas_criticas = ['ot', 'planta', 'anio_fuente', 'cliente', 'horas_estimadas_ot', 'horas_reales_ot', 'diferencia_horas']
+            columnas_disponibles = [col for col in columnas_criticas if col in ots_desviacion_negativa.columns]
+            if columnas_disponibles:
+                ots_desviacion_negativa[columnas_disponibles].to_excel(writer, sheet_name='OTs_Criticas', index=False)
+    return buffer.getvalue()
+
 def exportar_a_excel():
     """Exportar datos completos a Excel"""
     try:
         with st.spinner("📊 Generando archivo Excel..."):
-            # Crear un escritor de Excel
-            with pd.ExcelWriter('reporte_adimatec.xlsx', engine='openpyxl') as writer:
-                # Hoja 1: OT Master
-                ot_master_filtrado.to_excel(writer, sheet_name='OT_Master', index=False)
-                
-                # Hoja 2: Procesos
-                if not procesos_filtrados.empty:
-                    procesos_filtrados.to_excel(writer, sheet_name='Procesos', index=False)
-                
-                # Hoja 3: Resumen Ejecutivo
-                resumen_data = {
-                    'Métrica': [
-                        'Total OTs', 
-                        'OTs Facturadas', 
-                        'OTs en Proceso', 
-                        'OTs Vencidas', 
-                        'OTs por Vencer',
-                        '% Facturación',
-                        '% Reprocesos',
-                        'Horas Programadas Totales',
-                        'Desviaciones Positivas',
-                        'Desviaciones Negativas'
-                    ],
-                    'Valor': [
-                        total_ots,
-                        ots_facturadas,
-                        ots_en_proceso,
-                        ots_vencidas,
-                        ots_por_vencer,
-                        f"{porcentaje_facturado:.1f}%",
-                        f"{porcentaje_reprocesos:.1f}%",
-                        f"{total_horas_programadas:.1f}h",
-                        f"{horas_desviacion_positiva:.1f}h",
-                        f"{horas_desviacion_negativa:.1f}h"
-                    ]
-                }
-                pd.DataFrame(resumen_data).to_excel(writer, sheet_name='Resumen', index=False)
-                
-                # Hoja 4: OTs Críticas
-                if not ots_desviacion_negativa.empty:
-                    columnas_criticas = ['ot', 'cliente', 'horas_estimadas_ot', 'horas_reales_ot', 'diferencia_horas']
-                    columnas_disponibles = [col for col in columnas_criticas if col in ots_desviacion_negativa.columns]
-                    if columnas_disponibles:
-                        ots_desviacion_negativa[columnas_disponibles].to_excel(writer, sheet_name='OTs_Criticas', index=False)
+            excel = gestor.obtener_o_calcular('exportaciones', ('excel',) + clave_vista, versiones_datos, generar_excel)
             
             # Ofrecer descarga
-            with open('reporte_adimatec.xlsx', 'rb') as f:
-                st.download_button(
-                    label="📈 Descargar Excel Completo",
-                    data=f.read(),
-                    file_name=f"Reporte_Adimatec_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    use_container_width=True
-                )
+            st.download_button(
+                label="📈 Descargar Excel Completo",
+                data=excel,
+                file_name=f"Reporte_Adimatec_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                use_container_width=True
+            )
             
-            # Limpiar archivo temporal
-            if os.path.exists('reporte_adimatec.xlsx'):
-                os.remove('reporte_adimatec.xlsx')
-                
             st.success("✅ Archivo Excel generado exitosamente!")
             
     except Exception as e:
@@ -642,11 +974,13 @@ st.header("📋 Datos Detallados")
 tab1, tab2 = st.tabs(["OT Master", "Procesos"])
 with tab1:
     st.subheader("Tabla OT Master")
-    columnas_mostrar = ['ot', 'descripcion', 'cliente', 'estatus', 'fecha_entrega', 'horas_estimadas_ot', 'horas_reales_ot']
+    columnas_mostrar = ['ot', 'planta', 'anio_fuente', 'descripcion', 'cliente', 'estatus', 'fecha_entrega', 'horas_estimadas_ot', 'horas_reales_ot']
     columnas_disponibles = [col for col in columnas_mostrar if col in ot_master_filtrado.columns]
     if not ot_master_filtrado.empty:
         st.dataframe(ot_master_filtrado[columnas_disponibles], use_container_width=True, hide_index=True)
-        csv_ot = ot_master_filtrado.to_csv(index=False)
+        csv_ot = gestor.obtener_o_calcular(
+            'exportaciones', ('csv_ot_master',) + clave_vista, versiones_datos, lambda: ot_master_filtrado.drop(columns='ot_clave').to_csv(index=False)
+        )
         st.download_button(label="📥 Descargar OT Master como CSV", data=csv_ot, file_name="ot_master_filtrado.csv", mime="text/csv")
     else: 
         st.info("No hay datos para mostrar en OT Master")
@@ -658,15 +992,48 @@ with tab2:
         if nombre in procesos_filtrados.columns:
             columna_proceso = nombre
             break
-    columnas_mostrar_procesos = ['ot', columna_proceso, 'horas_estimadas', 'horas_reales', 'empleado_1', 'empleado_2']
+    columnas_mostrar_procesos = ['ot', 'planta', 'anio_fuente', columna_proceso, 'horas_estimadas', 'horas_reales', 'empleado_1', 'empleado_2']
     columnas_disponibles_procesos = [col for col in columnas_mostrar_procesos if col in procesos_filtrados.columns]
     if not procesos_filtrados.empty:
         st.dataframe(procesos_filtrados[columnas_disponibles_procesos], use_container_width=True, hide_index=True)
-        csv_procesos = procesos_filtrados.to_csv(index=False)
+        csv_procesos = gestor.obtener_o_calcular(
+            'exportaciones', ('csv_procesos',) + clave_vista, versiones_datos, lambda: procesos_filtrados.drop(columns='ot_clave').to_csv(index=False)
+        )
         st.download_button(label="📥 Descargar Procesos como CSV", data=csv_procesos, file_name="procesos_filtrados.csv", mime="text/csv")
     else: 
         st.info("No hay datos para mostrar en Procesos")
 
+# =============================================
+# ADMINISTRACIÓN DE CACHÉ (visible con ?admin=<ADIMATEC_ADMIN_TOKEN>)
+# =============================================
+# La caché es compartida entre sesiones: sin token configurado la vista queda deshabilitada
+token_admin = os.environ.get("ADIMATEC_ADMIN_TOKEN", "")
+if token_admin and hmac.compare_digest(st.query_params.get("admin", "").encode(), token_admin.encode()):
+    st.markdown("---")
+    st.header("⚙️ Administración de Caché")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Memoria usada", f"{gestor.bytes_usados / 1024 ** 2:.1f} MB")
+    with col2:
+        st.metric("Presupuesto", f"{gestor.presupuesto_bytes / 1024 ** 2:.0f} MB")
+    with col3:
+        st.metric("Versión de datos", version_datos)
+    st.dataframe(gestor.resumen(), use_container_width=True, hide_index=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("🔄 Recargar datos de la vista", use_container_width=True):
+            # Invalidación dirigida: particiones seleccionadas y todo lo derivado de sus versiones
+            for fuente in fuentes_seleccionadas:
+                gestor.eliminar('datos', clave_particion(fuente))
+            for version in versiones_datos:
+                gestor.invalidar(version)
+            st.rerun()
+    with col2:
+        if st.button("🗑️ Vaciar caché", use_container_width=True):
+            gestor.vaciar()
+            st.rerun()
+
 # Footer
 st.markdown("---")
 st.markdown(